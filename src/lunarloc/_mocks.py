@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class _Location:
     __slots__ = ["x", "y", "z"]
 
@@ -34,3 +37,14 @@ class Transform:
         """
         self.location = _Location(p)
         self.rotation = _Rotation(e)
+
+    @classmethod
+    def from_array(cls, arr: np.ndarray) -> "Transform":
+        """Create a mock carla Transform from a pose array.
+
+        Args:
+            arr: pose in (x, y, z, roll, pitch, yaw) [m, rad]
+        """
+        # Convert to Python floats once, rather than per field
+        x, y, z, roll, pitch, yaw = arr.tolist()
+        return cls((x, y, z), (roll, pitch, yaw))
@@ -1,5 +1,7 @@
+import numpy as np
+
 from ._mocks import Transform
-from .core import CameraDataReader, FrameDataReader
+from .core import CameraDataReader
 
 
 class PlaybackAgent:
@@ -9,8 +11,19 @@ class PlaybackAgent:
         "_frame_data",
         "_camera_data",
         "_frame",
-        "_frame_data_row",
+        "_frame_array",
+        "_frame_idx",
+        "_row_idx",
         "_max_frame",
+        "_input_frame",
+        "_input_data",
+        "_mission_time",
+        "_power",
+        "_linear_speed",
+        "_angular_speed",
+        "_cover_angle",
+        "_imu_matrix",
+        "_pose_matrix",
     ]
 
     def __init__(self, data_path: str):
@@ -20,16 +33,44 @@ class PlaybackAgent:
             data_path: The path to the data file.
         """
 
-        # Data Readers
-        self._frame_data = FrameDataReader(data_path)
+        # Data Readers, the camera reader shares its tabular data
         self._camera_data = CameraDataReader(data_path)
+        self._frame_data = self._camera_data.frame_data
+
+        # Frame numbers in the data set, sorted for stepping
+        self._frame_array = np.sort(self._frame_data.frames["frame"].to_numpy())
 
         # Initialize at the first frame
-        self._frame = self._frame_data.frames["frame"].min()
-        self._frame_data_row = self._frame_data[self._frame]
+        self._frame_idx = 0
+        self._frame = int(self._frame_array[0])
+        self._row_idx = self._frame_data.row_index(self._frame)
 
         # Set the max frame number
-        self._max_frame = self._frame_data.frames["frame"].max()
+        self._max_frame = int(self._frame_array[-1])
+
+        # Input data is cached for the most recently requested frame
+        self._input_frame = None
+        self._input_data = None
+
+        # Bind the frame data arrays read every frame
+        columns = self._frame_data.columns
+        self._mission_time = columns["mission_time"]
+        self._power = columns["power"]
+        self._linear_speed = columns["linear_speed"]
+        self._angular_speed = columns["angular_speed"]
+        self._cover_angle = columns["cover_angle"]
+        self._imu_matrix = self._frame_data.imu_matrix
+        self._pose_matrix = self._frame_data.pose_matrix
+
+    def __enter__(self) -> "PlaybackAgent":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the recording."""
+        self._camera_data.close()
 
     def set_frame(self, frame: int):
         """Jump to a specific frame.
@@ -44,16 +85,18 @@ class PlaybackAgent:
                 f"Frame {frame} is out of range. Max index is {self._max_frame}."
             )
 
-        # Try to set the frame data row
-        try:
-            self._frame_data_row = self._frame_data[frame]
-            self._frame = frame
-        except KeyError:
+        # Check if the frame is in the data set
+        i = np.searchsorted(self._frame_array, frame)
+        if self._frame_array[i] != frame:
             raise ValueError(f"Frame {frame} is not in the data set.")
 
+        self._frame_idx = int(i)
+        self._frame = int(frame)
+        self._row_idx = self._frame_data.row_index(self._frame)
+
     def at_end(self) -> bool:
         """Check if the agent is at the end of the data set."""
-        return self._frame == self._max_frame
+        return self._frame_idx == self._frame_array.size - 1
 
     def step_frame(self) -> int:
         """Step to the next frame in the data set. Stops at the last frame.
@@ -63,21 +106,21 @@ class PlaybackAgent:
         """
 
         # Step to the next frame in the data set
-        try:
-            self._frame = (
-                self._frame_data.frames[self._frame_data.frames["frame"] > self._frame]
-                .iloc[0]
-                .to_dict()["frame"]
-            )
-        except IndexError:
-            pass
+        if self._frame_idx + 1 < self._frame_array.size:
+            self._frame_idx += 1
+            self._frame = int(self._frame_array[self._frame_idx])
+            self._row_idx = self._frame_data.row_index(self._frame)
 
-        self._frame_data_row = self._frame_data[self._frame]
         return self._frame
 
     def input_data(self) -> dict:
         """Get the input data for the current frame."""
-        return self._camera_data.input_data(self._frame)
+        if self._input_frame != self._frame:
+            self._input_data = self._camera_data.input_data(self._frame)
+            self._input_frame = self._frame
+
+        # Copy the cached dictionaries so callers can modify them, images are read-only
+        return {key: dict(images) for key, images in self._input_data.items()}
 
     # Constant Functions
     def use_fiducials(self) -> bool:
@@ -100,29 +143,26 @@ class PlaybackAgent:
 
     # Frame Dependent Functions
     def get_mission_time(self) -> float:
-        return self._frame_data_row["mission_time"]
+        return self._mission_time[self._row_idx]
 
     def get_current_power(self) -> float:
-        return self._frame_data_row["power"]
+        return self._power[self._row_idx]
 
     def get_consumed_power(self) -> float:
         raise NotImplementedError("get_consumed_power not implemented")
 
     def get_imu_data(self) -> list:
-        data = []
-        data.append(self._frame_data_row["accel_x"])
-        data.append(self._frame_data_row["accel_y"])
-        data.append(self._frame_data_row["accel_z"])
-        data.append(self._frame_data_row["gyro_x"])
-        data.append(self._frame_data_row["gyro_y"])
-        data.append(self._frame_data_row["gyro_z"])
-        return data
+        return self._imu_matrix[self._row_idx].tolist()
+
+    def get_imu_array(self) -> np.ndarray:
+        """Get the IMU data as a read-only view, without copying it to a list."""
+        return self._imu_matrix[self._row_idx]
 
     def get_linear_speed(self) -> float:
-        return self._frame_data_row["linear_speed"]
+        return self._linear_speed[self._row_idx]
 
     def get_angular_speed(self) -> float:
-        return self._frame_data_row["angular_speed"]
+        return self._angular_speed[self._row_idx]
 
     def get_front_arm_angle(self) -> float:
         raise NotImplementedError("get_front_arm_angle not implemented")
@@ -137,47 +177,31 @@ class PlaybackAgent:
         raise NotImplementedError("get_back_drums_speed not implemented")
 
     def get_radiator_cover_angle(self) -> float:
-        return self._frame_data_row["cover_angle"]
+        return self._cover_angle[self._row_idx]
 
     def get_transform(self) -> Transform:
-        translation = [
-            self._frame_data_row["x"],
-            self._frame_data_row["y"],
-            self._frame_data_row["z"],
-        ]
-        rotation = [
-            self._frame_data_row["roll"],
-            self._frame_data_row["pitch"],
-            self._frame_data_row["yaw"],
-        ]
-        return Transform(p=translation, e=rotation)
+        return Transform.from_array(self._pose_matrix[self._row_idx])
 
     # Camera Functions
     def get_light_state(self, camera: str) -> float:
-        try:
-            return self._camera_data.get_frame(camera, self._frame, True)[
-                "light_intensity"
-            ]
-        except (ValueError, TypeError):
+        i = self._frame_data.camera_row_index(camera, self._frame, True)
+        if i is None:
             # The camera was never enabled, so we can just return the initial value
             return self._frame_data.initial["cameras"][camera]["light_intensity"]
 
+        return self._frame_data.camera_columns[camera]["light_intensity"][i].item()
+
     def get_camera_state(self, camera: str) -> bool:
-        try:
-            return self._camera_data.get_frame(camera, self._frame, True)["enable"]
-        except (ValueError, TypeError):
-            # ValueError: The camera was never enabled
-            # TypeError: There was no camera data for this frame
+        i = self._frame_data.camera_row_index(camera, self._frame, True)
+        if i is None:
+            # The camera was never enabled or there was no camera data for this frame
             return False
 
-    def get_camera_position(self, camera: str) -> Transform:
-        try:
-            row = self._camera_data.get_frame(camera, self._frame, True)
-            translation = [row["camera_x"], row["camera_y"], row["camera_z"]]
-            rotation = [row["camera_roll"], row["camera_pitch"], row["camera_yaw"]]
-            return Transform(p=translation, e=rotation)
+        return self._frame_data.camera_columns[camera]["enable"][i].item()
 
-        except (ValueError, TypeError):
+    def get_camera_position(self, camera: str) -> Transform:
+        i = self._frame_data.camera_row_index(camera, self._frame, True)
+        if i is None:
             # The camera was never enabled
             # TODO: This could also return the initial camera positions from the rover geometry
             return Transform(
@@ -185,6 +209,8 @@ class PlaybackAgent:
                 e=[0.0, 0.0, 0.0],
             )
 
+        return Transform.from_array(self._frame_data.camera_pose_matrices[camera][i])
+
     def get_light_position(self, camera: str) -> Transform:
         # TODO: Add a fixed offset for the light position
         raise NotImplementedError("get_light_position not implemented")
@@ -1,12 +1,176 @@
+import gzip
+import importlib.util
+import io
+import mmap
+import os
+import shutil
+import sys
 import tarfile
+import tempfile
 from pathlib import Path
-from collections import defaultdict
+from collections import OrderedDict
+from collections.abc import Iterator, Mapping
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
-import toml
 from PIL import Image
 
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+try:
+    import imagecodecs
+except ImportError:
+    # imagecodecs is optional, images are decoded with PIL instead
+    imagecodecs = None
+
+# pyarrow is optional, it parses CSV files with multiple threads into typed columns.
+# The C parser is asked to parse floats exactly as well, so both give the same values.
+if importlib.util.find_spec("pyarrow"):
+    _FRAMES_CSV_OPTIONS = {"engine": "pyarrow"}
+else:
+    _FRAMES_CSV_OPTIONS = {"float_precision": "round_trip"}
+
+_IMU_COLUMNS = ["accel_x", "accel_y", "accel_z", "gyro_x", "gyro_y", "gyro_z"]
+_POSE_COLUMNS = ["x", "y", "z", "roll", "pitch", "yaw"]
+_CAMERA_POSE_COLUMNS = [
+    "camera_x",
+    "camera_y",
+    "camera_z",
+    "camera_roll",
+    "camera_pitch",
+    "camera_yaw",
+]
+
+# Number of decoded images kept in memory by each CameraDataReader
+_IMAGE_CACHE_SIZE = 64
+
+
+def _open_uncompressed(path: Path) -> tuple[tarfile.TarFile, Optional[str]]:
+    """Open a recording as an uncompressed tar file.
+
+    Gzip compressed tar files do not support random access, so every extraction
+    has to inflate the archive up to the requested member. Compressed recordings
+    are inflated once to a temporary file so members can be read with a seek.
+
+    Args:
+        path: The path to the data file.
+
+    Returns:
+        The open tar file and the path of the temporary file, or None if the
+        recording was not compressed.
+    """
+
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+
+    if not compressed:
+        return tarfile.open(path, "r:"), None
+
+    dst = tempfile.NamedTemporaryFile(suffix=".tar", delete=False)
+    try:
+        with gzip.open(path, "rb") as src, dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        return tarfile.open(dst.name, "r:"), dst.name
+    except BaseException:
+        # Do not leave a partial copy behind, e.g. for a truncated recording
+        os.remove(dst.name)
+        raise
+
+
+def _matches_pil(data: memoryview) -> bool:
+    """Check if imagecodecs decodes a PNG to the same array as PIL.
+
+    imagecodecs expands palette and transparency (tRNS) images to RGB(A), does not
+    return booleans for 1-bit images and keeps 16 bits for color images, all of which
+    PIL handles differently.
+
+    Args:
+        data: The encoded image file.
+
+    Returns:
+        True if the image is a PNG that both decoders read the same way.
+    """
+
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        return False
+
+    # The IHDR chunk always comes first
+    bit_depth, color_type = data[24], data[25]
+    if not (bit_depth == 8 and color_type in (0, 2, 4, 6)) and not (
+        bit_depth == 16 and color_type == 0
+    ):
+        return False
+
+    # Check the chunks before the image data for transparency
+    position = 8
+    while position + 8 <= len(data):
+        length = int.from_bytes(data[position : position + 4], "big")
+        chunk_type = bytes(data[position + 4 : position + 8])
+        if chunk_type == b"tRNS":
+            return False
+        if chunk_type == b"IDAT":
+            return True
+
+        # Length, type and CRC fields surround the chunk data
+        position += length + 12
+
+    return False
+
+
+def _decode_image(data: memoryview) -> np.ndarray:
+    """Decode an encoded image file into a numpy array.
+
+    Args:
+        data: The encoded image file.
+
+    Returns:
+        A numpy array image.
+    """
+
+    # imagecodecs decodes PNGs directly into a numpy array, skipping PIL
+    if imagecodecs is not None and _matches_pil(data):
+        return imagecodecs.png_decode(data)
+
+    # TODO: Will this work for RGB semantic images?
+    return np.array(Image.open(io.BytesIO(data)))
+
+
+def _build_index(frames: pd.DataFrame) -> dict[int, int]:
+    """Map frame numbers to positional row indices.
+
+    Args:
+        frames: A DataFrame with a "frame" column.
+
+    Returns:
+        A dictionary mapping each frame number to its row position.
+    """
+    return dict(zip(frames["frame"].to_numpy().tolist(), range(len(frames))))
+
+
+class _RowView(Mapping):
+    """Read-only view of one row of column arrays, read one value at a time."""
+
+    __slots__ = ["_columns", "_i"]
+
+    def __init__(self, columns: dict[str, np.ndarray], i: int):
+        self._columns = columns
+        self._i = i
+
+    def __getitem__(self, key: str):
+        return self._columns[key][self._i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
 
 class FrameDataReader:
     """Reads frame data from a LAC simulator recording."""
@@ -15,7 +179,16 @@ class FrameDataReader:
         "_initial",
         "_metadata",
         "_frames",
+        "_columns",
+        "_imu_matrix",
+        "_pose_matrix",
+        "_frame_index",
         "_camera_frames",
+        "_camera_frame_arrays",
+        "_camera_columns",
+        "_camera_pose_matrices",
+        "_camera_rows",
+        "_first_frame",
         "_custom_records",
     ]
 
@@ -31,48 +204,140 @@ class FrameDataReader:
         if not path.exists():
             raise FileNotFoundError(f"File {path} not found")
 
-        tar_file = tarfile.open(path, "r:gz")
+        tar_file = tarfile.open(path, "r:*")
+        members = {m.name: m for m in tar_file.getmembers()}
 
         # Read the initialization data
-        self._initial = toml.loads(
-            tar_file.extractfile("initial.toml").read().decode("utf-8")
-        )
+        self._initial = tomllib.load(tar_file.extractfile(members["initial.toml"]))
         try:
             [self._initial[key] for key in ["fiducials", "lander", "rover", "cameras"]]
         except KeyError:
             raise ValueError("initial.toml is missing required keys")
 
-        self._metadata = toml.loads(
-            tar_file.extractfile("metadata.toml").read().decode("utf-8")
-        )
+        # Intern camera names so per-camera lookups can match on identity
+        self._initial["cameras"] = {
+            sys.intern(camera): config
+            for camera, config in self._initial["cameras"].items()
+        }
+
+        self._metadata = tomllib.load(tar_file.extractfile(members["metadata.toml"]))
 
         # Read the frame sensor data
-        self._frames = pd.read_csv(tar_file.extractfile("frames.csv"))
+        self._frames = pd.read_csv(
+            tar_file.extractfile(members["frames.csv"]), **_FRAMES_CSV_OPTIONS
+        )
+        self._columns = {c: self._frames[c].to_numpy() for c in self._frames.columns}
+        self._imu_matrix = np.ascontiguousarray(
+            self._frames[_IMU_COLUMNS].to_numpy(dtype=np.float64)
+        )
+        self._pose_matrix = np.ascontiguousarray(
+            self._frames[_POSE_COLUMNS].to_numpy(dtype=np.float64)
+        )
+
+        # Rows of these are handed out as views, so protect them from modification
+        self._imu_matrix.flags.writeable = False
+        self._pose_matrix.flags.writeable = False
+        self._frame_index = _build_index(self._frames)
+
+        # Every frame number from the first to the last frame in the data set
+        self._first_frame = int(self._columns["frame"].min())
+        frame_range = np.arange(self._first_frame, self._columns["frame"].max() + 1)
 
         # Read frame data for each camera
         self._camera_frames = {}
+        self._camera_frame_arrays = {}
+        self._camera_columns = {}
+        self._camera_pose_matrices = {}
+        self._camera_rows = {}
         for camera in self._initial["cameras"].keys():
             try:
-                self._camera_frames[camera] = pd.read_csv(
-                    tar_file.extractfile(f"cameras/{camera}/{camera}_frames.csv")
+                camera_frame = pd.read_csv(
+                    tar_file.extractfile(
+                        members[f"cameras/{camera}/{camera}_frames.csv"]
+                    ),
+                    float_precision="round_trip",
                 )
             except (pd.errors.EmptyDataError, KeyError):
                 # Some cameras may not have any frames
-                pass
+                continue
+
+            # Camera frames are ordered by frame number
+            camera_frame_numbers = camera_frame["frame"].to_numpy()
+            self._camera_frames[camera] = camera_frame
+            self._camera_frame_arrays[camera] = camera_frame_numbers
+            self._camera_columns[camera] = {
+                c: camera_frame[c].to_numpy() for c in camera_frame.columns
+            }
+            self._camera_pose_matrices[camera] = np.ascontiguousarray(
+                camera_frame[_CAMERA_POSE_COLUMNS].to_numpy(dtype=np.float64)
+            )
+
+            # Forward fill the latest camera row at each frame, -1 before the first
+            self._camera_rows[camera] = (
+                np.searchsorted(camera_frame_numbers, frame_range, side="right") - 1
+            )
 
         # Read any custom records
         self._custom_records = {}
-        for record in tar_file.getnames():
+        for record, member in members.items():
             if record.startswith("custom/"):
                 self._custom_records[record.split("/")[-1].split(".")[0]] = pd.read_csv(
-                    tar_file.extractfile(record)
+                    tar_file.extractfile(member), float_precision="round_trip"
                 )
 
         tar_file.close()
 
-    def __getitem__(self, frame: int) -> dict:
+    def __getitem__(self, frame: int) -> Mapping:
         """Convenience function to get a row from the frame data."""
-        return self._frames[self._frames["frame"] == frame].to_dict(orient="records")[0]
+        return _RowView(self._columns, self._frame_index[frame])
+
+    def row_index(self, frame: int) -> int:
+        """Get the positional row index of a frame in the frame data.
+
+        Args:
+            frame: The frame number to look up.
+
+        Returns:
+            The row position of the frame in the frame data.
+        """
+        return self._frame_index[frame]
+
+    def camera_row_index(
+        self, camera: str, frame: int, use_previous_frame=False
+    ) -> int:
+        """Get the positional row index of a frame in a camera's frame data.
+
+        Args:
+            camera: The camera to get the row for.
+            frame: The frame number to look up.
+            use_previous_frame: If True, use the previous frame if the frame number is not found.
+
+        Returns:
+            The row position in the camera frame data, or None if there is no row.
+        """
+
+        # Elements are ordered by frame number, so we can binary search
+        frames = self._camera_frame_arrays.get(camera)
+        if frames is None:
+            # The camera was never enabled
+            return None
+
+        if use_previous_frame:
+            rows = self._camera_rows[camera]
+            offset = frame - self._first_frame
+            if 0 <= offset < rows.size:
+                i = rows[offset]
+            else:
+                i = np.searchsorted(frames, frame, side="right") - 1
+
+            if i < 0:
+                return None
+        else:
+            i = np.searchsorted(frames, frame)
+            if i == frames.size or frames[i] != frame:
+                return None
+
+        return int(i)
 
     @property
     def initial(self) -> dict:
@@ -86,10 +351,33 @@ class FrameDataReader:
     def frames(self) -> pd.DataFrame:
         return self._frames
 
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        return self._columns
+
+    @property
+    def imu_matrix(self) -> np.ndarray:
+        """IMU data (accel x, y, z, gyro x, y, z) with one row per frame."""
+        return self._imu_matrix
+
+    @property
+    def pose_matrix(self) -> np.ndarray:
+        """Rover pose (x, y, z, roll, pitch, yaw) with one row per frame."""
+        return self._pose_matrix
+
     @property
     def camera_frames(self) -> dict[str, pd.DataFrame]:
         return self._camera_frames
 
+    @property
+    def camera_columns(self) -> dict[str, dict[str, np.ndarray]]:
+        return self._camera_columns
+
+    @property
+    def camera_pose_matrices(self) -> dict[str, np.ndarray]:
+        """Camera pose (x, y, z, roll, pitch, yaw) with one row per camera frame."""
+        return self._camera_pose_matrices
+
     @property
     def custom_records(self) -> dict[str, pd.DataFrame]:
         return self._custom_records
@@ -99,28 +387,105 @@ class CameraDataReader:
     """Read image data from a LAC simulator recording."""
 
     _tar_file: tarfile.TarFile
+    _tar_path: Optional[str]
+    _members: dict[str, tarfile.TarInfo]
+    _mmap: mmap.mmap
     _frame_data: FrameDataReader
+    _cameras: tuple[str, ...]
+    _semantic_cameras: tuple[str, ...]
+    _image_cache: OrderedDict
+    _decode_pool: ThreadPoolExecutor
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, frame_data: FrameDataReader = None):
         """Read image data from a LAC simulator recording.
 
         Args:
             path: The path to the data file.
+            frame_data: The tabular data for the same recording, read if not provided.
         """
 
-        # Get the tabular data
-        self._frame_data = FrameDataReader(path)
-
         # Open the tar file
-        self._tar_file = tarfile.open(path, "r:gz")
+        path = Path(path).expanduser().resolve()
+        self._tar_file, self._tar_path = _open_uncompressed(path)
+
+        try:
+            self._members = {m.name: m for m in self._tar_file.getmembers()}
+
+            # Get the tabular data, from the uncompressed copy if there is one
+            if frame_data is None:
+                frame_data = FrameDataReader(self._tar_path or path)
+            self._frame_data = frame_data
+
+            # The configured cameras do not change during a recording
+            cameras = self._frame_data.initial["cameras"]
+            self._cameras = tuple(cameras)
+            self._semantic_cameras = tuple(
+                camera for camera, config in cameras.items() if config["use_semantic"]
+            )
+
+            # Map the uncompressed archive into memory so images can be read without a copy
+            self._mmap = mmap.mmap(
+                self._tar_file.fileobj.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except BaseException:
+            self.close()
+            raise
+
+        # On POSIX the open file keeps the data alive, so the temporary copy can be
+        # removed now and is not left behind if the process is killed
+        if self._tar_path is not None and os.name == "posix":
+            os.remove(self._tar_path)
+            self._tar_path = None
+
+        # Keep recently decoded images so repeated reads skip the tar and decoder
+        self._image_cache = OrderedDict()
+
+        # Images from different cameras are decoded in parallel
+        workers = min(len(self._cameras), os.cpu_count() or 1)
+        self._decode_pool = ThreadPoolExecutor(max_workers=max(workers, 1))
+
+    def __enter__(self) -> "CameraDataReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the recording and remove any temporary copy of it."""
+
+        try:
+            self._decode_pool.shutdown(wait=False)
+        except AttributeError:
+            # There is no decode pool to shut down
+            pass
+
+        try:
+            self._mmap.close()
+        except (AttributeError, BufferError):
+            # There is no memory map to close, or an image buffer is still in use
+            pass
+
         try:
             self._tar_file.close()
         except AttributeError:
             # There is no tar file to close
             pass
 
+        try:
+            if self._tar_path is not None:
+                os.remove(self._tar_path)
+                self._tar_path = None
+        except (AttributeError, FileNotFoundError):
+            # There is no temporary file to remove
+            pass
+
+    @property
+    def frame_data(self) -> FrameDataReader:
+        return self._frame_data
+
     def get_cameras(self) -> list[str]:
         """Get the list of cameras in the recording."""
         return list(self._frame_data.camera_frames.keys())
@@ -134,28 +499,17 @@ class CameraDataReader:
             use_previous_frame: If True, use the previous frame if the frame number is not found.
 
         Returns:
-            A dictionary containing the camera data.
+            A dictionary containing the camera data, or None if the camera was
+            never enabled or has no data for this frame.
         """
 
-        # Get the frame data
-        try:
-            camera_frame = self._frame_data.camera_frames[camera]
-        except KeyError:
-            # The camera was never enabled
-            raise ValueError(f"Camera {camera} not found")
-
         # Find the row for the frame number
-        try:
-            if use_previous_frame:
-                # Elements are ordered by frame number, so we can just take the last one
-                row = camera_frame[camera_frame["frame"] <= frame].iloc[-1]
-            else:
-                row = camera_frame[camera_frame["frame"] == frame].iloc[0]
-
-            return row.to_dict()
-        except IndexError:
+        i = self._frame_data.camera_row_index(camera, frame, use_previous_frame)
+        if i is None:
             return None
 
+        return self._frame_data.camera_frames[camera].iloc[i].to_dict()
+
     def get_image(self, camera: str, frame: int, image_type="grayscale") -> np.ndarray:
         """Get an image from a camera for a given frame number.
 
@@ -164,7 +518,32 @@ class CameraDataReader:
             frame: The frame number to get the image for.
             image_type: The type of image to get ("grayscale" or "semantic")
         Returns:
-            A numpy array image from the camera.
+            A read-only numpy array image from the camera.
+        """
+
+        file_name = self._image_name(camera, frame, image_type)
+        if file_name is None:
+            return None
+
+        # Check for a recently decoded copy of the image
+        key = (camera, image_type, file_name)
+        image = self._cached_image(key)
+        if image is None:
+            data = self._read_image(self._image_member(*key))
+            image = self._cache_image(key, _decode_image(data))
+
+        return image
+
+    def _image_name(self, camera: str, frame: int, image_type: str) -> str:
+        """Get the file name of an image from a camera for a given frame number.
+
+        Args:
+            camera: The camera to get the image from.
+            frame: The frame number to get the image for.
+            image_type: The type of image to get ("grayscale" or "semantic")
+
+        Returns:
+            The file name of the image, or None if there is no image at this frame.
         """
 
         # If semantic, check if the camera had it enabled
@@ -174,38 +553,75 @@ class CameraDataReader:
         ):
             raise ValueError(f"Camera {camera} does not have semantic images enabled.")
 
-        # Try to get data for the camera at this frame
-        try:
-            frame_data = self.get_frame(camera, frame)
-        except ValueError:
-            # The camera was never enabled, no images exist for this camera
-            return None
-
-        if frame_data is None:
-            # Camera data is not available at this frame
+        # Get data for the camera at this frame
+        i = self._frame_data.camera_row_index(camera, frame)
+        if i is None:
+            # The camera was never enabled or data is not available at this frame
             return None
 
         try:
-            file_name = frame_data[image_type]
+            return self._frame_data.camera_columns[camera][image_type][i]
         except KeyError:
             raise ValueError(
                 f"image_type '{image_type}' must be either 'grayscale' or 'semantic'"
             )
-            # Camera data is not available at this frame
 
-        # Extract the image from the tar file
+    def _cached_image(self, key: tuple[str, str, str]) -> np.ndarray:
+        """Get a decoded image from the cache, or None if it is not cached."""
         try:
-            image_file = self._tar_file.extractfile(
-                f"cameras/{camera}/{image_type}/{file_name}"
-            )
+            self._image_cache.move_to_end(key)
+            return self._image_cache[key]
+        except KeyError:
+            return None
+
+    def _cache_image(self, key: tuple[str, str, str], image: np.ndarray) -> np.ndarray:
+        """Add a decoded image to the cache, evicting the oldest if it is full."""
+
+        # Cached images are shared between callers, so protect them from modification
+        image.flags.writeable = False
+        self._image_cache[key] = image
+        if len(self._image_cache) > _IMAGE_CACHE_SIZE:
+            self._image_cache.popitem(last=False)
+
+        return image
+
+    def _image_member(
+        self, camera: str, image_type: str, file_name: str
+    ) -> tarfile.TarInfo:
+        """Get the tar file member of an image.
+
+        Args:
+            camera: The camera the image belongs to.
+            image_type: The type of image ("grayscale" or "semantic").
+            file_name: The file name of the image in the recording.
+
+        Returns:
+            The tar file member of the image.
+        """
+
+        try:
+            return self._members[f"cameras/{camera}/{image_type}/{file_name}"]
         except KeyError:
             raise RuntimeError(
                 f"Image {file_name} not found. Record is likely malformed."
             )
 
-        # Read the image as a numpy array
-        # TODO: Will this work for RGB semantic images?
-        return np.array(Image.open(image_file))
+    def _read_image(self, member: tarfile.TarInfo) -> memoryview:
+        """Get the encoded bytes of an image from the memory mapped tar file."""
+        return memoryview(self._mmap)[
+            member.offset_data : member.offset_data + member.size
+        ]
+
+    def _prefetch(self, start: int, end: int):
+        """Ask the OS to read a range of the memory mapped tar file ahead of use."""
+
+        # madvise is not available on all platforms
+        if not hasattr(self._mmap, "madvise"):
+            return
+
+        # The start of the range must be aligned to a page
+        start -= start % mmap.PAGESIZE
+        self._mmap.madvise(mmap.MADV_WILLNEED, start, end - start)
 
     def input_data(self, frame: int) -> dict:
         """Get a LAC style input data dictionary for a given frame number.
@@ -217,17 +633,40 @@ class CameraDataReader:
             A LAC style input data dictionary.
         """
 
-        input_data = defaultdict(dict)
-
-        # Iterate over each camera and get grayscale images
-        for camera, config in self._frame_data.initial["cameras"].items():
-            # Get the grayscale image
-            input_data["Grayscale"][camera] = self.get_image(camera, frame, "grayscale")
-
-            # If semantic is enabled, get the semantic image
-            if config["use_semantic"]:
-                input_data["Semantic"][camera] = self.get_image(
-                    camera, frame, "semantic"
-                )
-
-        return dict(input_data)
+        # Every camera has a grayscale image, only some have semantic images
+        input_data = {"Grayscale": dict.fromkeys(self._cameras)}
+        if self._semantic_cameras:
+            input_data["Semantic"] = dict.fromkeys(self._semantic_cameras)
+
+        pending = []
+        for key, images in input_data.items():
+            image_type = key.lower()
+            for camera in images:
+                file_name = self._image_name(camera, frame, image_type)
+                if file_name is None:
+                    continue
+
+                cache_key = (camera, image_type, file_name)
+                image = self._cached_image(cache_key)
+                if image is not None:
+                    images[camera] = image
+                    continue
+
+                member = self._image_member(*cache_key)
+                pending.append((member, images, camera, cache_key))
+
+        # Read images in archive order so the tar file is accessed sequentially
+        pending.sort(key=lambda p: p[0].offset_data)
+        for member, *_ in pending:
+            self._prefetch(member.offset_data, member.offset_data + member.size)
+
+        # Slicing the memory map is cheap, so only decoding is done in parallel
+        futures = []
+        for member, images, camera, cache_key in pending:
+            data = self._read_image(member)
+            futures.append(self._decode_pool.submit(_decode_image, data))
+
+        for (_, images, camera, cache_key), future in zip(pending, futures):
+            images[camera] = self._cache_image(cache_key, future.result())
+
+        return input_data